@@ -9,52 +9,57 @@ def setup_demo_database(db_path=":memory:"):
     :return: A sqlite3 connection object.
     """
     try:
-        conn = sqlite3.connect(db_path)
+        # Autocommit mode: the inserts below open their transaction explicitly
+        conn = sqlite3.connect(db_path, isolation_level=None)
         cursor = conn.cursor()
         print(f"Connected to database: {db_path}")
 
-        # --- 1. Create Employees Table ---
-        print("Creating Employees table...")
-        cursor.execute("""
+        # Bulk-load settings: WAL journal, fewer fsyncs, temp tables and a 20 MB page cache in memory
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA cache_size=-20000")
+
+        # --- 1. Create Employees and Departments Tables (one script, one call) ---
+        print("Creating Employees and Departments tables...")
+        cursor.executescript("""
             CREATE TABLE IF NOT EXISTS Employees (
                 employee_id INTEGER PRIMARY KEY,
                 name TEXT NOT NULL,
                 department TEXT,
                 salary REAL
             );
-        """)
-        
-        # --- 2. Insert Employee Data ---
-        print("Inserting Employee data...")
-        employee_data = [
-            (101, 'Alice Smith', 'Sales', 60000.00),
-            (102, 'Bob Johnson', 'IT', 75000.00),
-            (103, 'Charlie Brown', 'Sales', 62000.00),
-            (104, 'Diana Prince', 'HR', 55000.00),
-            (105, 'Clark Kent', 'IT', 80000.00)
-        ]
-        cursor.executemany("INSERT INTO Employees VALUES (?, ?, ?, ?)", employee_data)
-        
-        # --- 3. Create Departments Table ---
-        print("Creating Departments table...")
-        cursor.execute("""
             CREATE TABLE IF NOT EXISTS Departments (
                 dept_id INTEGER PRIMARY KEY,
                 name TEXT NOT NULL
             );
         """)
+
+        # Steps 2-3 run in one transaction, committed on exit (rolled back on error)
+        with conn:
+            conn.execute("BEGIN")
+
+            # --- 2. Insert Employee Data ---
+            print("Inserting Employee data...")
+            employee_data = [
+                (101, 'Alice Smith', 'Sales', 60000.00),
+                (102, 'Bob Johnson', 'IT', 75000.00),
+                (103, 'Charlie Brown', 'Sales', 62000.00),
+                (104, 'Diana Prince', 'HR', 55000.00),
+                (105, 'Clark Kent', 'IT', 80000.00)
+            ]
+            cursor.executemany("INSERT INTO Employees VALUES (?, ?, ?, ?)", employee_data)
         
-        # --- 4. Insert Department Data ---
-        print("Inserting Department data...")
-        department_data = [
-            (1, 'Sales'),
-            (2, 'IT'),
-            (3, 'HR')
-        ]
-        cursor.executemany("INSERT INTO Departments VALUES (?, ?)", department_data)
-        
-        # --- 5. Commit Changes ---
-        conn.commit()
+            # --- 3. Insert Department Data ---
+            print("Inserting Department data...")
+            department_data = [
+                (1, 'Sales'),
+                (2, 'IT'),
+                (3, 'HR')
+            ]
+            cursor.executemany("INSERT INTO Departments VALUES (?, ?)", department_data)
+
+        # --- 4. Commit Changes (done when the `with conn:` block exits) ---
         print("Database setup complete.")
         
         return conn
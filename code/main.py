@@ -1,9 +1,19 @@
 import sqlite3
-import re
+import hashlib
 import os
+import importlib.util
 import logging
+import asyncio
+import queue
+import collections
+import functools
+import math
+import time
+import httpx
 from google import genai
 from google.genai.errors import APIError
+from pydantic import BaseModel, ValidationError
+from row_limit import enforce_row_limit
 
 # --- 1. CONFIGURATION ---
 
@@ -15,18 +25,73 @@ logging.basicConfig(
 )
 logger = logging.getLogger('SqliteAgent')
 
+# One keep-alive connection pool is shared by every Gemini call, so back-to-back
+# requests skip the TLS handshake. HTTP/2 needs the optional h2 package.
+_HTTP2 = importlib.util.find_spec("h2") is not None
+_HTTP_LIMITS = httpx.Limits(max_keepalive_connections=8)
+
 try:
     # Initialize the Gemini Client. 
     # It will automatically look for the GEMINI_API_KEY environment variable.
-    client = genai.Client()
+    client = genai.Client(
+        http_options=genai.types.HttpOptions(
+            timeout=30_000,
+            httpx_client=httpx.Client(http2=_HTTP2, limits=_HTTP_LIMITS),
+            httpx_async_client=httpx.AsyncClient(http2=_HTTP2, limits=_HTTP_LIMITS),
+        )
+    )
     logger.info("Gemini client initialized successfully.")
 except Exception as e:
-    logger.error(f"Error initializing Gemini client. Is GEMINI_API_KEY set? Error: {e}")
+    logger.error("Error initializing Gemini client. Is GEMINI_API_KEY set? Error: %s", e)
     # Exit if the client can't be initialized (required for API calls)
     exit()
 
 MODEL_NAME = "gemini-2.5-flash" 
 
+# Security gate: only SELECT and PRAGMA table_info statements may be executed.
+# A plain prefix check on the upper-cased head keeps the gate easy to audit.
+_ALLOWED_SQL_PREFIXES = ("SELECT", "PRAGMA TABLE_INFO")
+
+# Upper bound on returned rows, enforced even if the LLM leaves out LIMIT
+MAX_RESULT_ROWS = 100
+
+# Read connections shared by concurrent prompts (file databases only)
+CONNECTION_POOL_SIZE = 4
+# Rows pulled from the cursor per fetchmany() call while formatting results
+FETCH_CHUNK_SIZE = 64
+# Lifetime of the explicit Gemini cache holding the schema/rules prefix
+PROMPT_CACHE_TTL_SECONDS = 300
+# Gemini only caches prefixes of at least this many tokens. With PAD_STABLE_PREFIX set, a
+# shorter prefix gets reference notes appended, but only if that reaches the threshold
+MIN_CACHEABLE_TOKENS = 1024
+PAD_STABLE_PREFIX = False
+# Most recent prompts kept in the exact (md5) cache (oldest entries are dropped first)
+EXACT_CACHE_SIZE = 256
+# Prompts whose embeddings are at least this cosine-similar reuse a previously generated query.
+# Risk: a hit replays the stored SQL without the LLM seeing the new prompt, so a close but
+# different request ("lowest paid" after "highest paid", or "Update Bob's salary" after
+# "What is Bob's salary") gets the earlier query's results and is never rejected. Hits log
+# their score so such mismatches can be spotted; raise the threshold if they show up.
+# Off by default for that reason; only the exact (md5) cache is used then.
+SEMANTIC_CACHE_ENABLED = False
+EMBEDDING_MODEL = "text-embedding-004"
+SEMANTIC_CACHE_THRESHOLD = 0.92
+# Most recent prompts kept for semantic lookup (oldest entries are dropped first)
+SEMANTIC_CACHE_SIZE = 256
+
+class ReactStep(BaseModel):
+    """Structured output of the combined REASON / THINK / ACT call."""
+    reason: str
+    think: str
+    sql: str
+
+@functools.lru_cache(maxsize=32)
+def _format_header(columns: tuple[str, ...]) -> tuple[str, str, int]:
+    """Returns (header_line, separator_line, width) for a result's column names."""
+    header_line = f"| {' | '.join(columns)} |"
+    width = len(header_line) - 2
+    return header_line, f"|{'-' * width}|", width
+
 # --- 2. AGENT CLASS ---
 
 class SqliteAgent:
@@ -35,156 +100,431 @@ class SqliteAgent:
     to generate and execute restricted SQL.
     """
 
-    def __init__(self, db_path=":memory:", table_names=None):
-        self.conn = sqlite3.connect(db_path)
+    def __init__(self, db_path=":memory:", table_names=None, pool_size=CONNECTION_POOL_SIZE):
+        self.db_path = db_path
+        self.conn = self._connect()
         self.cursor = self.conn.cursor()
         self.table_names = table_names if table_names is not None else []
+        self._schema_cache: str | None = None
+        self._stable_prefix = ""
+        self._cache_name: str | None = None
+        self._cache_expires_at = 0.0
+        self._exact_cache: collections.OrderedDict[str, str] = collections.OrderedDict()
+        self._sem_cache: collections.deque[tuple[list[float], str]] = collections.deque(maxlen=SEMANTIC_CACHE_SIZE)
         self.logger = logger
         self._setup_database()
+        self._conn_pool = self._build_pool(pool_size)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        """Deletes the server-side prompt cache and closes every database connection."""
+        self._delete_prompt_cache()
+        while not self._conn_pool.empty():
+            conn = self._conn_pool.get_nowait()
+            if conn is not self.conn:
+                conn.close()
+        self.conn.close()
+
+    def _connect(self):
+        """Opens a connection tuned for the agent's read-mostly workload."""
+        # Autocommit mode: transactions are opened explicitly where writes happen
+        conn = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False)
+        # Read-mostly tuning: 64 MB page cache, 256 MB memory map, temp tables in memory
+        conn.execute("PRAGMA cache_size=-65536")
+        conn.execute("PRAGMA mmap_size=268435456")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+
+    def _build_pool(self, pool_size):
+        """
+        Fills the pool of read-only connections used to execute queries. An in-memory
+        database is private to its connection, so there the pool holds only self.conn.
+        """
+        pool = queue.Queue()
+        pool.put(self.conn)
+        if self.db_path != ":memory:":
+            for _ in range(pool_size - 1):
+                conn = self._connect()
+                conn.execute("PRAGMA query_only=ON")
+                pool.put(conn)
+        self.logger.debug("Connection pool ready with %s connection(s).", pool.qsize())
+        return pool
 
     def _setup_database(self):
         """Creates example tables and populates them."""
         self.logger.info("Setting up example database tables...")
         
-        # Create Tables and Insert Data
-        self.cursor.execute("CREATE TABLE IF NOT EXISTS Employees (employee_id INTEGER PRIMARY KEY, name TEXT NOT NULL, department TEXT, salary REAL);")
-        self.cursor.executemany("INSERT INTO Employees VALUES (?, ?, ?, ?)", [
-            (101, 'Alice Smith', 'Sales', 60000.00),
-            (102, 'Bob Johnson', 'IT', 75000.00),
-            (103, 'Charlie Brown', 'Sales', 62000.00),
-            (104, 'Diana Prince', 'HR', 55000.00),
-            (105, 'Clark Kent', 'IT', 80000.00)
-        ])
-        self.cursor.execute("CREATE TABLE IF NOT EXISTS Departments (dept_id INTEGER PRIMARY KEY, name TEXT NOT NULL);")
-        self.cursor.executemany("INSERT INTO Departments VALUES (?, ?)", [
-            (1, 'Sales'),
-            (2, 'IT'),
-            (3, 'HR')
-        ])
-        
-        self.conn.commit()
+        # Writes are only allowed while (re)seeding; see query_only=ON below
+        self.conn.execute("PRAGMA query_only=OFF")
+        # Bulk-load settings: WAL journal and fewer fsyncs
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+
+        # All inserts run in one transaction (committed on exit, rolled back on error)
+        with self.conn:
+            self.conn.execute("BEGIN")
+            # Create Tables and Insert Data
+            self.cursor.execute("CREATE TABLE IF NOT EXISTS Employees (employee_id INTEGER PRIMARY KEY, name TEXT NOT NULL, department TEXT, salary REAL);")
+            self.cursor.executemany("INSERT INTO Employees VALUES (?, ?, ?, ?)", [
+                (101, 'Alice Smith', 'Sales', 60000.00),
+                (102, 'Bob Johnson', 'IT', 75000.00),
+                (103, 'Charlie Brown', 'Sales', 62000.00),
+                (104, 'Diana Prince', 'HR', 55000.00),
+                (105, 'Clark Kent', 'IT', 80000.00)
+            ])
+            self.cursor.execute("CREATE TABLE IF NOT EXISTS Departments (dept_id INTEGER PRIMARY KEY, name TEXT NOT NULL);")
+            self.cursor.executemany("INSERT INTO Departments VALUES (?, ?)", [
+                (1, 'Sales'),
+                (2, 'IT'),
+                (3, 'HR')
+            ])
+
+        # The agent only reads from here on; SQLite itself now refuses any write
+        self.conn.execute("PRAGMA query_only=ON")
         self.table_names = ['Employees', 'Departments']
+        self._schema_cache = None
+        self._stable_prefix = self._build_stable_prefix()
+        # A prefix known to be too small would only have its cache creation refused
+        if self._ensure_cacheable_prefix():
+            self._cache_name = self._create_prompt_cache()
         self.logger.info("Database structure created and populated.")
 
-    def _get_schema_description(self):
-        """Generates the schema string for the LLM context."""
+    def _build_stable_prefix(self):
+        """
+        Builds the schema and rules block shared by every LLM call. It is kept
+        byte-identical and sent first so Gemini's implicit prefix caching can reuse it.
+        """
+        return f"""
+        **CONTEXT:** You are a component of a read-only SQL agent for a SQLite database.
+        **SCHEMA:** {self._get_schema_description()}
+        **STRICT RULES:** 1. ONLY generate a valid SELECT or PRAGMA statement. 2. REJECT DML/DDL. 3. All SELECTs MUST include LIMIT 100.
+        """
+
+    def _build_reference_notes(self):
+        """Builds column details and basic example queries for every table."""
+        notes = ["# Reference notes (column details and example queries)"]
+        for table in self.table_names:
+            self.cursor.execute("SELECT name, type, \"notnull\", pk FROM pragma_table_info(?)", (table,))
+            notes.append(f"Table {table}:")
+            for name, col_type, not_null, pk in self.cursor.fetchall():
+                details = col_type
+                if pk:
+                    details += ", PRIMARY KEY"
+                if not_null:
+                    details += ", NOT NULL"
+                notes.append(f"  - {name}: {details}")
+            notes.append(f"Example (describe): PRAGMA table_info({table})")
+            notes.append(f"Example (all rows): SELECT * FROM {table} LIMIT 100")
+        return "\n".join(notes) + "\n"
+
+    def _count_tokens(self, text: str) -> int | None:
+        """Returns the model's token count for text, or None if the API call fails."""
+        try:
+            return client.models.count_tokens(model=MODEL_NAME, contents=text).total_tokens
+        except Exception as e:
+            # Optional optimisation: never let it stop the agent from being built
+            self.logger.debug("Token count unavailable: %s", e)
+            return None
+
+    def _ensure_cacheable_prefix(self) -> bool:
+        """
+        Warns when the stable prefix is too short for Gemini to cache it and, if
+        PAD_STABLE_PREFIX is set, pads it with reference notes when that is enough to
+        reach MIN_CACHEABLE_TOKENS. Returns False only if the prefix is known to be
+        below that size (an unknown token count still lets caching be tried).
+        """
+        tokens = self._count_tokens(self._stable_prefix)
+        if tokens is None or tokens >= MIN_CACHEABLE_TOKENS:
+            return True
+
+        self.logger.warning(
+            "Stable prompt prefix is %s tokens; prompt caching needs at least %s.", tokens, MIN_CACHEABLE_TOKENS
+        )
+        if not PAD_STABLE_PREFIX:
+            return False
+
+        # Padding only pays off if it unlocks caching; otherwise it just makes every call bigger
+        padded_prefix = self._stable_prefix + self._build_reference_notes()
+        tokens = self._count_tokens(padded_prefix)
+        if tokens is None or tokens < MIN_CACHEABLE_TOKENS:
+            self.logger.warning("Padding would only reach %s tokens; keeping the unpadded prefix.", tokens)
+            return False
+
+        self._stable_prefix = padded_prefix
+        self.logger.info("Padded stable prompt prefix to %s tokens.", tokens)
+        return True
+
+    def _create_prompt_cache(self) -> str | None:
+        """
+        Stores the stable prefix as an explicit Gemini CachedContent, replacing any
+        previous one. Returns None (prefix is sent inline) if the cache can't be created,
+        e.g. when the prefix is below the model's minimum cacheable size or the API is
+        unreachable.
+        """
+        self._delete_prompt_cache()
+
+        try:
+            cache = client.caches.create(
+                model=MODEL_NAME,
+                config=genai.types.CreateCachedContentConfig(
+                    contents=[self._stable_prefix],
+                    ttl=f"{PROMPT_CACHE_TTL_SECONDS}s",
+                )
+            )
+        except Exception as e:
+            # Covers API refusals and transport errors (e.g. no network) alike
+            self.logger.warning("Prompt cache not created, sending the schema inline instead: %s", e)
+            return None
+
+        # Refresh a little before the server-side TTL runs out
+        self._cache_expires_at = time.monotonic() + PROMPT_CACHE_TTL_SECONDS - 30
+        self.logger.info("Prompt cache created: %s", cache.name)
+        return cache.name
+
+    def _delete_prompt_cache(self):
+        """Deletes the current prompt cache, if any, so it stops being billed before its TTL ends."""
+        if not self._cache_name:
+            return
+        try:
+            client.caches.delete(name=self._cache_name)
+            self.logger.debug("Prompt cache %s deleted.", self._cache_name)
+        except Exception as e:
+            self.logger.debug("Could not delete prompt cache %s: %s", self._cache_name, e)
+        self._cache_name = None
+
+    def _refresh_prompt_cache(self):
+        """
+        Extends the TTL of the current prompt cache in place, so requests already using
+        its name keep working. On any failure the prefix is sent inline from then on.
+        """
+        try:
+            client.caches.update(
+                name=self._cache_name,
+                config=genai.types.UpdateCachedContentConfig(ttl=f"{PROMPT_CACHE_TTL_SECONDS}s"),
+            )
+        except Exception as e:
+            self.logger.warning("Prompt cache refresh failed, sending the schema inline instead: %s", e)
+            self._cache_name = None
+            return
+
+        self._cache_expires_at = time.monotonic() + PROMPT_CACHE_TTL_SECONDS - 30
+        self.logger.debug("Prompt cache %s extended.", self._cache_name)
+
+    def _get_schema_description(self, force_refresh=False):
+        """Generates the schema string for the LLM context (cached after the first call)."""
+        if self._schema_cache is not None and not force_refresh:
+            return self._schema_cache
+
         schema_parts = []
         for table in self.table_names:
-            self.cursor.execute(f"PRAGMA table_info({table})")
-            columns = [f"{col[1]} ({col[2]})" for col in self.cursor.fetchall()]
-            schema_parts.append(f"Table **{table}**: ({', '.join(columns)})")
-        return "\n".join(schema_parts)
+            self.cursor.execute("SELECT name, type FROM pragma_table_info(?)", (table,))
+            columns = ", ".join(f"{name} ({col_type})" for name, col_type in self.cursor.fetchall())
+            schema_parts.append(f"Table **{table}**: ({columns})")
+        self._schema_cache = "\n".join(schema_parts)
+        return self._schema_cache
+
+    async def _llm_call(self, prompt: str, stage_suffix: str) -> ReactStep | None:
+        """Helper for the single LLM call that returns all three ReACT stages as JSON."""
+        if self._cache_name and time.monotonic() >= self._cache_expires_at:
+            # Push the deadline out first so concurrent prompts don't all refresh the cache;
+            # until the refresh lands they keep using the still-valid cache
+            self._cache_expires_at = math.inf
+            await asyncio.to_thread(self._refresh_prompt_cache)
+
+        # The stable prefix comes from the cache, or is sent first when there is none
+        contents = [stage_suffix, "User Request: " + prompt]
+        if self._cache_name is None:
+            contents.insert(0, self._stable_prefix)
 
-    def _llm_call(self, prompt: str, context: str) -> str:
-        """Helper for a single, focused LLM call."""
         try:
-            response = client.models.generate_content(
+            response = await client.aio.models.generate_content(
                 model=MODEL_NAME,
-                contents=[context + "\n\nUser Request: " + prompt],
+                contents=contents,
                 config=genai.types.GenerateContentConfig(
-                    # Keep temperature low for precise, instructional responses
-                    temperature=0.2, 
+                    cached_content=self._cache_name,
+                    # Greedy decoding: identical prompts give byte-identical SQL, which keeps
+                    # the response caches consistent
+                    temperature=0.0,
+                    top_k=1,
+                    top_p=1.0,
+                    response_mime_type="application/json",
+                    response_schema=ReactStep,
                 )
             )
-            return response.text.strip()
-        except APIError as e:
-            self.logger.error(f"Gemini API Error: {e}")
-            return "ERROR: API Call Failed"
+            if isinstance(response.parsed, ReactStep):
+                return response.parsed
+            return ReactStep.model_validate_json(response.text)
+        except (APIError, httpx.HTTPError) as e:
+            self.logger.error("Gemini API Error: %s", e)
+            return None
+        except ValidationError as e:
+            self.logger.error("Malformed ReACT response from Gemini: %s", e)
+            return None
 
-    def execute_prompt(self, user_prompt: str):
-        """Processes the user prompt using the explicit ReACT steps."""
-        self.logger.info("\n" + "="*50)
-        self.logger.info(f"STARTING ReACT FOR: {user_prompt}")
-        self.logger.info("="*50)
-        
-        schema = self._get_schema_description()
-        
-        # --- 1. REASON (Database Knowledge/Plan) ---
-        reason_context = f"""
-        **ROLE:** You are the **REASON** component of an SQL agent. 
-        **SCHEMA:** {schema}
-        **TASK:** Explain, in a single sentence, which table(s) contain the necessary data to answer the user request.
-        **OUTPUT FORMAT:** Respond ONLY with the reasoning sentence.
-        """
-        reason = self._llm_call(user_prompt, reason_context)
-        self.logger.info(f"🧠 REASON (Database Look): {reason}")
-
-        # --- 2. THINK (Query Logic/Plan) ---
-        think_context = f"""
-        **ROLE:** You are the **THINK** component of an SQL agent.
-        **TASK:** Explain, in a single sentence, the logical steps required to construct the query (e.g., 'I must filter by X and order by Y'). Use the schema and the previous REASON step as context.
-        **OUTPUT FORMAT:** Respond ONLY with the thinking sentence.
-        """
-        think = self._llm_call(user_prompt, think_context)
-        self.logger.info(f"🤔 THINK (Query Logic): {think}")
+    async def _embed(self, text: str) -> list[float] | None:
+        """Returns the unit-length embedding of text, or None if the API call fails."""
+        try:
+            response = await client.aio.models.embed_content(model=EMBEDDING_MODEL, contents=text)
+        except (APIError, httpx.HTTPError) as e:
+            self.logger.warning("Embedding failed, skipping the semantic cache: %s", e)
+            return None
+
+        values = response.embeddings[0].values
+        norm = math.sqrt(sum(v * v for v in values)) or 1.0
+        return [v / norm for v in values]
+
+    def _semantic_lookup(self, embedding: list[float]) -> tuple[str | None, float]:
+        """
+        Returns (cached SQL, similarity) of the most similar earlier prompt, or (None, best
+        score seen) when nothing reaches the threshold. Blocking; run it in a worker thread.
+        """
+        best_sql, best_score = None, 0.0
+        # Snapshot the deque so inserts from the event loop can't change it mid-scan
+        for cached_embedding, cached_sql in list(self._sem_cache):
+            # Embeddings are stored normalised, so the dot product is the cosine similarity
+            score = sum(a * b for a, b in zip(embedding, cached_embedding))
+            if score > best_score:
+                best_sql, best_score = cached_sql, score
+        if best_score < SEMANTIC_CACHE_THRESHOLD:
+            return None, best_score
+        return best_sql, best_score
+
+    async def execute_prompt(self, user_prompt: str):
+        """
+        Processes the user prompt using the explicit ReACT steps. Prompts can be awaited
+        concurrently: LLM calls overlap, and each query runs on a pooled connection.
+        """
+        if self.logger.isEnabledFor(logging.INFO):
+            self.logger.info("\n" + "="*50)
+            self.logger.info("STARTING ReACT FOR: %s", user_prompt)
+            self.logger.info("="*50)
+
+        # --- 0. CACHE (replay the SQL of an identical or similar earlier prompt against fresh data) ---
+        prompt_key = hashlib.md5(user_prompt.encode()).hexdigest()
+        cached_sql = self._exact_cache.get(prompt_key)
+        if cached_sql is not None:
+            self.logger.info("♻️ CACHE HIT (Exact): %s", cached_sql)
+            return (await asyncio.to_thread(self._run_sql, cached_sql))[1]
+
+        embedding = await self._embed(user_prompt) if SEMANTIC_CACHE_ENABLED else None
+        cached_sql = None
+        if embedding is not None and self._sem_cache:
+            cached_sql, score = await asyncio.to_thread(self._semantic_lookup, embedding)
+        if cached_sql is not None:
+            # Not promoted to the exact cache: a fuzzy match must not outlive its semantic entry
+            self.logger.info("♻️ CACHE HIT (Semantic, similarity %.3f): %s", score, cached_sql)
+            return (await asyncio.to_thread(self._run_sql, cached_sql))[1]
         
-        # --- 3. ACT (SQL Generation) ---
-        sql_context = f"""
-        **ROLE:** You are the **ACTION** component of an SQL agent.
-        **STRICT RULES:** 1. ONLY generate a valid SELECT or PRAGMA statement. 2. REJECT DML/DDL. 3. All SELECTs MUST include LIMIT 100.
-        **TASK:** Generate the final, executable, and constrained SQLite SQL query.
-        **OUTPUT FORMAT:** Respond ONLY with the SQL query text.
+        # --- 1-3. REASON, THINK, ACT (one structured LLM call) ---
+        react_suffix = """
+        **ROLE:** Work through the REASON, THINK and ACTION components in order, each one using the previous ones as context.
+        **REASON:** Explain, in a single sentence, which table(s) contain the necessary data to answer the user request.
+        **THINK:** Explain, in a single sentence, the logical steps required to construct the query (e.g., 'I must filter by X and order by Y').
+        **ACTION:** Generate the final, executable, and constrained SQLite SQL query.
+        **OUTPUT FORMAT:** Respond ONLY with a JSON object with the fields `reason`, `think` and `sql`. `sql` holds only the SQL query text.
         """
-        generated_sql = self._llm_call(user_prompt, sql_context)
-        self.logger.warning(f"🔨 ACT (Generated SQL): {generated_sql}")
+        step = await self._llm_call(user_prompt, react_suffix)
+        if step is None:
+            return "ERROR: API Call Failed"
+
+        self.logger.info("🧠 REASON (Database Look): %s", step.reason)
+        self.logger.info("🤔 THINK (Query Logic): %s", step.think)
+        generated_sql = step.sql.strip()
+        self.logger.warning("🔨 ACT (Generated SQL): %s", generated_sql)
+
+        succeeded, answer = await asyncio.to_thread(self._run_sql, generated_sql)
+        # Only queries that passed validation and ran are worth replaying
+        if succeeded:
+            self._exact_cache[prompt_key] = generated_sql
+            if len(self._exact_cache) > EXACT_CACHE_SIZE:
+                self._exact_cache.popitem(last=False)
+            if embedding is not None:
+                self._sem_cache.append((embedding, generated_sql))
+        return answer
 
+    def _run_sql(self, generated_sql: str) -> tuple[bool, str]:
+        """
+        Validates and executes the SQL on a pooled connection (blocking; run it in a
+        worker thread). Returns (succeeded, formatted answer).
+        """
         # --- 4. EXECUTE & OBSERVE (Validation and DB Execution) ---
         
         # Validation (Security Gate)
-        normalized_sql = generated_sql.upper().strip()
-        allowed_pattern = re.compile(r"^(SELECT|PRAGMA TABLE_INFO|PRAGMA table_info)", re.IGNORECASE)
+        candidate = generated_sql.lstrip()
+        head = candidate[:20].upper()
         
-        if not allowed_pattern.match(normalized_sql):
-            self.logger.error(f"❌ EXECUTE FAILURE: Security rejection of unauthorized command: {normalized_sql.split()[0]}.")
-            return "Query rejected. Agent is restricted to SELECT/DESCRIBE only."
+        if not head.startswith(_ALLOWED_SQL_PREFIXES):
+            # An empty response has no first word to report
+            first_word = candidate.split(None, 1)[0] if candidate else ""
+            self.logger.error("❌ EXECUTE FAILURE: Security rejection of unauthorized command: %s.", first_word)
+            return False, "Query rejected. Agent is restricted to SELECT/DESCRIBE only."
 
         self.logger.debug("✅ VALIDATION SUCCESS: Query is safe. Executing...")
 
+        if head.startswith("SELECT"):
+            bounded_sql = enforce_row_limit(generated_sql, MAX_RESULT_ROWS)
+            if bounded_sql is not generated_sql:
+                self.logger.warning("🔒 No LIMIT in generated SQL, capping at %s rows.", MAX_RESULT_ROWS)
+                generated_sql = bounded_sql
+
+        conn = self._conn_pool.get()
         try:
-            self.cursor.execute(generated_sql)
+            cursor = conn.cursor()
+            cursor.execute(generated_sql)
             
-            header = [desc[0] for desc in self.cursor.description]
-            results = self.cursor.fetchall()
+            columns = tuple(desc[0] for desc in cursor.description)
+
+            # Format rows chunk by chunk so only FETCH_CHUNK_SIZE raw tuples are held at once
+            row_lines = []
+            while True:
+                chunk = cursor.fetchmany(FETCH_CHUNK_SIZE)
+                if not chunk:
+                    break
+                row_lines.extend(f"| {' | '.join(map(str, row))} |" for row in chunk)
             
             # Log the Observation
-            self.logger.info(f"📊 OBSERVATION (DB Result): Executed successfully, {len(results)} rows returned.")
+            self.logger.info("📊 OBSERVATION (DB Result): Executed successfully, %s rows returned.", len(row_lines))
             
             # Format the Answer
-            if not results:
-                return "No results found for your query."
-
-            output = [f"| {' | '.join(header)} |"]
-            output.append(f"|{'-' * (len(output[0]) - 2)}|")
-            for row in results:
-                formatted_row = []
-                for item in row:
-                    formatted_row.append(str(item))
-                output.append(f"| {' | '.join(formatted_row)} |")
+            if not row_lines:
+                return True, "No results found for your query."
 
-            return "\n\nFINAL ANSWER:\n" + "\n".join(output)
+            # The agent's schema is fixed, so the same column layouts keep coming back
+            header_line, separator_line, _ = _format_header(columns)
+            body = "\n".join(row_lines)
+            return True, f"\n\nFINAL ANSWER:\n{header_line}\n{separator_line}\n{body}"
 
         except sqlite3.Error as e:
-            self.logger.error(f"❌ OBSERVATION (SQL Error): {e}")
-            return f"Error executing SQL: {e}"
+            self.logger.error("❌ OBSERVATION (SQL Error): %s", e)
+            return False, f"Error executing SQL: {e}"
+        finally:
+            self._conn_pool.put(conn)
 
 # --- 3. EXECUTION DEMO ---
 
-if __name__ == "__main__":
-    
-    # Initialize the agent
-    agent = SqliteAgent()
+async def run_demos(agent):
+    """Runs the demo prompts one after another so each ReACT trace stays readable."""
 
     # --- DEMO 1: ALLOWED Query (SELECT) ---
     allowed_query = "Who is the highest paid employee and what is their salary?"
-    result = agent.execute_prompt(allowed_query)
-    print(result)
 
     # --- DEMO 2: ALLOWED Query (DESCRIBE) ---
     describe_query = "What columns are available in the Departments table?"
-    result = agent.execute_prompt(describe_query)
-    print(result)
 
     # --- DEMO 3: REJECTED Query (DML) ---
     rejected_query = "Update Bob Johnson's salary to 100000."
-    result = agent.execute_prompt(rejected_query)
-    print(result)
+
+    for query in (allowed_query, describe_query, rejected_query):
+        result = await agent.execute_prompt(query)
+        print(result)
+
+if __name__ == "__main__":
+    
+    # Initialize the agent (closing it deletes its server-side prompt cache)
+    with SqliteAgent() as agent:
+        asyncio.run(run_demos(agent))
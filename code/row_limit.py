@@ -0,0 +1,51 @@
+"""Row cap for generated SELECTs, shared by main.py and sample.py."""
+
+def _scan_sql(sql: str) -> tuple[str, bool]:
+    """
+    Returns (sql without trailing comments, semicolons and whitespace, whether it has a
+    LIMIT clause outside any parentheses). Quoted text and comments are skipped.
+    """
+    code_end = 0
+    depth = 0
+    has_limit = False
+    i, n = 0, len(sql)
+    while i < n:
+        ch = sql[i]
+        if ch in "'\"`[":
+            close = "]" if ch == "[" else ch
+            j = sql.find(close, i + 1)
+            i = n if j == -1 else j + 1
+            code_end = i
+        elif sql.startswith("--", i):
+            j = sql.find("\n", i)
+            i = n if j == -1 else j + 1
+        elif sql.startswith("/*", i):
+            j = sql.find("*/", i + 2)
+            i = n if j == -1 else j + 2
+        elif ch.isalnum() or ch in "_$":
+            # Read the whole word so names like "unlimited" or "limit_x" don't match
+            j = i + 1
+            while j < n and (sql[j].isalnum() or sql[j] in "_$"):
+                j += 1
+            if depth == 0 and sql[i:j].upper() == "LIMIT":
+                has_limit = True
+            i = code_end = j
+        else:
+            if ch == "(":
+                depth += 1
+            elif ch == ")":
+                depth -= 1
+            if not ch.isspace() and ch != ";":
+                code_end = i + 1
+            i += 1
+    return sql[:code_end], has_limit
+
+def enforce_row_limit(sql: str, max_rows: int) -> str:
+    """
+    Appends LIMIT max_rows to a SELECT without a top-level LIMIT clause. A query that
+    already has one (whatever its expression) is returned unchanged.
+    """
+    code, has_limit = _scan_sql(sql)
+    if has_limit:
+        return sql
+    return f"{code} LIMIT {max_rows}"
@@ -1,15 +1,27 @@
 import sqlite3
-import re
 import os
+import importlib.util
+import httpx
 from google import genai
 from google.genai.errors import APIError
+from row_limit import enforce_row_limit
 
 # --- 1. CONFIGURATION ---
+# One keep-alive connection pool is shared by every Gemini call, so back-to-back
+# requests skip the TLS handshake. HTTP/2 needs the optional h2 package.
+_HTTP2 = importlib.util.find_spec("h2") is not None
+_HTTP_LIMITS = httpx.Limits(max_keepalive_connections=8)
+
 # IMPORTANT: Replace with your actual API key or ensure it's set in your environment variables
 # You can get a key from Google AI Studio.
 try:
     # Uses the GEMINI_API_KEY environment variable by default
-    client = genai.Client()
+    client = genai.Client(
+        http_options=genai.types.HttpOptions(
+            timeout=30_000,
+            httpx_client=httpx.Client(http2=_HTTP2, limits=_HTTP_LIMITS),
+        )
+    )
 except Exception as e:
     print(f"Error initializing Gemini client: {e}")
     print("Please ensure your GEMINI_API_KEY environment variable is set correctly.")
@@ -18,6 +30,13 @@ except Exception as e:
 # Model for code generation
 MODEL_NAME = "gemini-2.5-flash" 
 
+# Security gate: only SELECT and PRAGMA table_info statements may be executed.
+# A plain prefix check on the upper-cased head keeps the gate easy to audit.
+_ALLOWED_SQL_PREFIXES = ("SELECT", "PRAGMA TABLE_INFO")
+
+# Upper bound on returned rows, enforced even if the LLM leaves out LIMIT
+MAX_RESULT_ROWS = 100
+
 # --- 2. AGENT CLASS ---
 
 class SqliteAgent:
@@ -33,9 +52,16 @@ class SqliteAgent:
         :param db_path: Path to the SQLite database file. Default is in-memory.
         :param table_names: A list of table names to use for schema description.
         """
-        self.conn = sqlite3.connect(db_path)
+        # Autocommit mode: transactions are opened explicitly where writes happen
+        self.conn = sqlite3.connect(db_path, isolation_level=None, check_same_thread=False)
+        # Read-mostly tuning: 64 MB page cache, 256 MB memory map, temp tables in memory
+        self.conn.execute("PRAGMA cache_size=-65536")
+        self.conn.execute("PRAGMA mmap_size=268435456")
+        self.conn.execute("PRAGMA temp_store=MEMORY")
         self.cursor = self.conn.cursor()
         self.table_names = table_names if table_names is not None else []
+        self._schema_cache: str | None = None
+        self._stable_prefix = ""
         self._setup_database()
         print(f"Agent initialized and connected to database: {db_path}")
 
@@ -43,59 +69,84 @@ class SqliteAgent:
         """Creates example tables for demonstration."""
         print("Creating example tables...")
         
-        # Table 1: Employees
-        self.cursor.execute("""
-            CREATE TABLE IF NOT EXISTS Employees (
-                employee_id INTEGER PRIMARY KEY,
-                name TEXT NOT NULL,
-                department TEXT,
-                salary REAL
-            );
-        """)
-        self.cursor.executemany("INSERT INTO Employees VALUES (?, ?, ?, ?)", [
-            (101, 'Alice Smith', 'Sales', 60000.00),
-            (102, 'Bob Johnson', 'IT', 75000.00),
-            (103, 'Charlie Brown', 'Sales', 62000.00),
-            (104, 'Diana Prince', 'HR', 55000.00),
-            (105, 'Clark Kent', 'IT', 80000.00)
-        ])
-        
-        # Table 2: Departments
-        self.cursor.execute("""
-            CREATE TABLE IF NOT EXISTS Departments (
-                dept_id INTEGER PRIMARY KEY,
-                name TEXT NOT NULL
-            );
-        """)
-        self.cursor.executemany("INSERT INTO Departments VALUES (?, ?)", [
-            (1, 'Sales'),
-            (2, 'IT'),
-            (3, 'HR')
-        ])
+        # Writes are only allowed while (re)seeding; see query_only=ON below
+        self.conn.execute("PRAGMA query_only=OFF")
+        # Bulk-load settings: WAL journal and fewer fsyncs
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+
+        # All inserts run in one transaction (committed on exit, rolled back on error)
+        with self.conn:
+            self.conn.execute("BEGIN")
+            # Table 1: Employees
+            self.cursor.execute("""
+                CREATE TABLE IF NOT EXISTS Employees (
+                    employee_id INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    department TEXT,
+                    salary REAL
+                );
+            """)
+            self.cursor.executemany("INSERT INTO Employees VALUES (?, ?, ?, ?)", [
+                (101, 'Alice Smith', 'Sales', 60000.00),
+                (102, 'Bob Johnson', 'IT', 75000.00),
+                (103, 'Charlie Brown', 'Sales', 62000.00),
+                (104, 'Diana Prince', 'HR', 55000.00),
+                (105, 'Clark Kent', 'IT', 80000.00)
+            ])
         
-        self.conn.commit()
+            # Table 2: Departments
+            self.cursor.execute("""
+                CREATE TABLE IF NOT EXISTS Departments (
+                    dept_id INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL
+                );
+            """)
+            self.cursor.executemany("INSERT INTO Departments VALUES (?, ?)", [
+                (1, 'Sales'),
+                (2, 'IT'),
+                (3, 'HR')
+            ])
         
+        # The agent only reads from here on; SQLite itself now refuses any write
+        self.conn.execute("PRAGMA query_only=ON")
+
         # Update table names for schema description
         self.table_names = ['Employees', 'Departments']
+        self._schema_cache = None
+        self._stable_prefix = self._build_stable_prefix()
+
+    def _get_schema_description(self, force_refresh=False):
+        """
+        Generates the schema for the prompt to guide the LLM.
+
+        The schema is static for the lifetime of the agent, so the result is cached
+        and the PRAGMA lookups only run again when force_refresh is True.
+        """
+        if self._schema_cache is not None and not force_refresh:
+            return self._schema_cache
 
-    def _get_schema_description(self):
-        """Generates the schema for the prompt to guide the LLM."""
         schema_parts = []
         for table in self.table_names:
-            # PRAGMA table_info(table) returns schema details
-            self.cursor.execute(f"PRAGMA table_info({table})")
-            columns = [f"{col[1]} ({col[2]})" for col in self.cursor.fetchall()]
-            schema_parts.append(f"Table **{table}**: ({', '.join(columns)})")
+            # The table-valued pragma takes the table name as a bound parameter, so one
+            # prepared statement is reused from sqlite3's statement cache for every table
+            self.cursor.execute("SELECT name, type FROM pragma_table_info(?)", (table,))
+            columns = ", ".join(f"{name} ({col_type})" for name, col_type in self.cursor.fetchall())
+            schema_parts.append(f"Table **{table}**: ({columns})")
         
-        return "\n".join(schema_parts)
+        self._schema_cache = "\n".join(schema_parts)
+        return self._schema_cache
 
-    def _generate_sql(self, user_prompt: str) -> str:
-        """Uses the Gemini API to generate the restricted SQL query."""
+    def _build_stable_prefix(self):
+        """
+        Builds the system instruction once per schema. Keeping it byte-identical
+        across calls lets Gemini's implicit prefix caching reuse it.
+        """
         schema = self._get_schema_description()
-        
+
         # The prompt is based on the ReACT constraints from the previous response
         # but formatted for a single call for code generation.
-        system_prompt = f"""
+        return f"""
         You are a View-Only SQL Generator. Your task is to translate the user's request into a single, valid SQLite SQL query.
 
         **CURRENT DATABASE SCHEMA:**
@@ -107,19 +158,23 @@ class SqliteAgent:
         3.  **LIMIT 100:** All `SELECT` queries MUST include `LIMIT 100` at the end.
         4.  **OUTPUT FORMAT:** Respond ONLY with the SQL query text. Do not include any explanations, Markdown formatting (e.g., ```sql`), or extra text.
         """
-        
+
+    def _generate_sql(self, user_prompt: str) -> str:
+        """Uses the Gemini API to generate the restricted SQL query."""
         try:
             response = client.models.generate_content(
                 model=MODEL_NAME,
                 contents=[user_prompt],
                 config=genai.types.GenerateContentConfig(
-                    system_instruction=system_prompt,
-                    # Setting a high temperature for potentially complex SQL generation
-                    temperature=0.4, 
+                    system_instruction=self._stable_prefix,
+                    # Greedy decoding so identical prompts always produce the same SQL
+                    temperature=0.0,
+                    top_k=1,
+                    top_p=1.0,
                 )
             )
             return response.text.strip()
-        except APIError as e:
+        except (APIError, httpx.HTTPError) as e:
             print(f"Gemini API Error: {e}")
             return f"ERROR: Could not generate SQL due to API issue: {e}"
 
@@ -132,21 +187,24 @@ class SqliteAgent:
         print(f"Generated SQL: {generated_sql}")
 
         # 2. Validation (The Critical Security Layer)
-        normalized_sql = generated_sql.upper().strip()
+        candidate = generated_sql.lstrip()
+        head = candidate[:20].upper()
         
-        # Regex to check for allowed commands at the start of the query
-        allowed_pattern = re.compile(r"^(SELECT|PRAGMA TABLE_INFO|PRAGMA table_info)", re.IGNORECASE)
-        
-        if not allowed_pattern.match(normalized_sql):
+        # Check for allowed commands at the start of the query
+        if not head.startswith(_ALLOWED_SQL_PREFIXES):
             print("\n❌ VALIDATION REJECTED: Only SELECT and PRAGMA table_info statements are allowed.")
             return "Query rejected. This agent is restricted to SELECT and DESCRIBE TABLE operations only."
 
+        # Cap SELECTs that came back without LIMIT 100
+        if head.startswith("SELECT"):
+            generated_sql = enforce_row_limit(generated_sql, MAX_RESULT_ROWS)
+
         # 3. Final Execution
         try:
             self.cursor.execute(generated_sql)
             
             # Check if it was a PRAGMA (DESCRIBE) or a SELECT
-            if normalized_sql.startswith("PRAGMA"):
+            if head.startswith("PRAGMA"):
                 header = [desc[0] for desc in self.cursor.description]
                 results = self.cursor.fetchall()
                 print("✅ Execution Success (Schema Description):")
@@ -0,0 +1,68 @@
+##Regression tests for the LIMIT cap on generated SELECTs (run: python -m unittest discover tests/tests)
+import os
+import sqlite3
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "code"))
+from row_limit import enforce_row_limit
+
+
+class EnforceRowLimitTest(unittest.TestCase):
+
+    def setUp(self):
+        self.conn = sqlite3.connect(":memory:")
+        self.conn.executescript("""
+            CREATE TABLE Employees (employee_id INTEGER PRIMARY KEY, name TEXT, department TEXT, salary REAL);
+            CREATE TABLE Departments (dept_id INTEGER PRIMARY KEY, name TEXT);
+            INSERT INTO Employees VALUES (101, 'Alice', 'Sales', 60000), (102, 'Bob', 'IT', 75000), (103, 'Clark', 'IT', 80000);
+            INSERT INTO Departments VALUES (1, 'Sales'), (2, 'IT');
+        """)
+
+    def tearDown(self):
+        self.conn.close()
+
+    def run_sql(self, sql, params=()):
+        return self.conn.execute(enforce_row_limit(sql, 2), params)
+
+    def test_existing_limit_expressions_are_kept(self):
+        cases = [
+            ("SELECT * FROM Employees LIMIT 1", ()),
+            ("SELECT * FROM Employees LIMIT -1", ()),
+            ("SELECT * FROM Employees LIMIT 1+1", ()),
+            ("SELECT * FROM Employees LIMIT (SELECT COUNT(*) FROM Departments)", ()),
+            ("SELECT * FROM Employees LIMIT :n", {"n": 1}),
+            ("SELECT * FROM Employees LIMIT 1 OFFSET 1;", ()),
+            ("SELECT * FROM Employees limit 1, 1 /* done */ ;", ()),
+        ]
+        for sql, params in cases:
+            with self.subTest(sql=sql):
+                self.assertEqual(enforce_row_limit(sql, 2), sql)
+                self.run_sql(sql, params).fetchall()
+
+    def test_missing_limit_is_appended(self):
+        rows = self.run_sql("SELECT * FROM Employees ORDER BY salary DESC; -- done").fetchall()
+        self.assertEqual([row[0] for row in rows], [103, 102])
+
+    def test_nested_limit_does_not_count(self):
+        sql = "SELECT * FROM Employees WHERE salary > (SELECT salary FROM Employees ORDER BY salary LIMIT 1)"
+        self.assertTrue(enforce_row_limit(sql, 2).endswith(" LIMIT 2"))
+        self.assertEqual(len(self.run_sql(sql).fetchall()), 2)
+
+    def test_limit_inside_names_strings_and_comments_does_not_count(self):
+        for sql in [
+            "SELECT name AS unlimited FROM Employees",
+            "SELECT name AS limit_x FROM Employees",
+            "SELECT name FROM Employees WHERE name != 'LIMIT 5'",
+            "SELECT name -- LIMIT 3\nFROM Employees",
+        ]:
+            with self.subTest(sql=sql):
+                self.assertEqual(len(self.run_sql(sql).fetchall()), 2)
+
+    def test_duplicate_column_names_are_kept(self):
+        cursor = self.run_sql("SELECT e.name, d.name FROM Employees e JOIN Departments d ON e.department = d.name")
+        self.assertEqual([desc[0] for desc in cursor.description], ["name", "name"])
+
+
+if __name__ == "__main__":
+    unittest.main()